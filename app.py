@@ -15,17 +15,24 @@ import base64
 from io import BytesIO
 import requests
 import time
+import hmac
+import atexit
 
 # --- Initialization ---
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
 
 # --- Import Configuration ---
-from config import GEMINI_API_KEY, GEMINI_MODEL
+from config import GEMINI_API_KEY, GEMINI_MODEL, GEMINI_API_BASE_URL, PROFILER_ADMIN_TOKEN, PROFILE_OUTPUT_DIR
+from config import CAPTURE_UPLOADS, UPLOAD_CAPTURE_DIR, UPLOAD_CAPTURE_QUEUE_SIZE
+from profiler import RequestProfiler
+from llm_scheduler import get_shared_scheduler, DIAGNOSIS_SUMMARY, TREATMENT_FOLLOWUP, CASUAL_CHAT
+from upload_capture import UploadCapture
 
 # --- Gemini API Configuration ---
 API_KEY = GEMINI_API_KEY
-GEMINI_API_URL = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent?key={API_KEY}"
+GEMINI_API_URL = f"{GEMINI_API_BASE_URL}/v1beta/models/{GEMINI_MODEL}:generateContent?key={API_KEY}"
+llm_scheduler = get_shared_scheduler()
 
 # --- Load Local Model ---
 try:
@@ -33,10 +40,35 @@ try:
     with open('class_indices.json', 'r') as f:
         class_indices = json.load(f)
     class_names = {v: k for k, v in class_indices.items()}
+    # Maps the display names returned by predict_disease() back to class folder names.
+    class_folders = {k.replace("_", " "): k for k in class_indices}
     print("✅ Disease diagnosis model loaded successfully.")
 except Exception as e:
     print(f"❌ Error loading local model: {e}")
     disease_model = None 
+    class_folders = {}
+
+# --- Load Location-Aware Crop Recommender ---
+try:
+    crop_recommender = joblib.load('crop_location_recommender.joblib')
+    print("✅ Crop recommender loaded successfully.")
+except Exception as e:
+    print(f"❌ Error loading crop recommender: {e}")
+    crop_recommender = None
+
+# --- Retraining Corpus Capture (writes happen off the request path) ---
+upload_capture = None
+capture_root = os.path.realpath(UPLOAD_CAPTURE_DIR)
+static_root = os.path.realpath(app.static_folder)
+if CAPTURE_UPLOADS and os.path.commonpath([capture_root, static_root]) == static_root:
+    print(f"❌ UPLOAD_CAPTURE_DIR '{UPLOAD_CAPTURE_DIR}' is inside the public static folder. Upload capture disabled.")
+elif CAPTURE_UPLOADS:
+    upload_capture = UploadCapture(root=UPLOAD_CAPTURE_DIR, max_queue=UPLOAD_CAPTURE_QUEUE_SIZE)
+    upload_capture.start()
+    atexit.register(upload_capture.stop)
+
+# --- On-Demand Profiler (idle until armed through /admin/profile) ---
+profiler = RequestProfiler(output_dir=PROFILE_OUTPUT_DIR)
 
 # --- Helper Functions ---
 def preprocess_image(image, target_size=(224, 224)):
@@ -68,7 +100,7 @@ def predict_disease(image):
     return predicted_class_name.replace("_", " "), float(confidence)
 
 # --- Gemini API Call with Fallback ---
-def get_gemini_response(prompt):
+def get_gemini_response(prompt, priority=CASUAL_CHAT):
     """Calls the Gemini API but returns None on failure instead of crashing."""
     if not API_KEY:
         print("⚠️ Gemini API key is missing. Operating in fallback mode.")
@@ -77,7 +109,12 @@ def get_gemini_response(prompt):
     payload = {"contents": [{"parts": [{"text": prompt}]}]}
     max_retries = 2 # Reduced for faster fallback
     delay = 1
+    deadline = llm_scheduler.deadline_for(priority)
     for attempt in range(max_retries):
+        # Wait for a slot in the shared quota; give up early if it would miss the deadline.
+        if not llm_scheduler.acquire(prompt, priority, deadline):
+            print("⏱️ Gemini quota busy. Operating in fallback mode.")
+            return None
         try:
             response = requests.post(GEMINI_API_URL, json=payload, headers={'Content-Type': 'application/json'}, timeout=15)
             response.raise_for_status()
@@ -85,10 +122,14 @@ def get_gemini_response(prompt):
             return result['candidates'][0]['content']['parts'][0]['text']
         except requests.exceptions.RequestException as e:
             print(f"API request failed (attempt {attempt + 1}): {e}")
-            if e.response and e.response.status_code == 403:
+            if e.response is not None and e.response.status_code == 403:
                 print("❌ Gemini API key is invalid. Operating in fallback mode.")
                 return None
-            time.sleep(delay)
+            if e.response is not None and e.response.status_code == 429:
+                # Quota exhausted: hold back every caller rather than sleeping here.
+                llm_scheduler.pause(delay)
+            else:
+                time.sleep(delay)
             delay *= 2
     
     print("API connection failed after multiple retries. Operating in fallback mode.")
@@ -100,6 +141,7 @@ def index():
     return render_template('index.html')
 
 @app.route('/chat', methods=['POST'])
+@profiler.profiled('chat')
 def chat():
     user_message = request.form.get('message')
     uploaded_file = request.files.get('image')
@@ -108,11 +150,15 @@ def chat():
     if uploaded_file:
         # --- This is an analysis request ---
         disease_prediction, confidence = predict_disease(uploaded_file)
+        class_folder = class_folders.get(disease_prediction)
+        if upload_capture and class_folder:
+            uploaded_file.seek(0)
+            upload_capture.submit(uploaded_file.read(), class_folder, confidence)
         uploaded_file.seek(0)
         image_b64 = image_to_base64(uploaded_file)
         
         prompt = f"You are Agri-Sage, a friendly AI agricultural advisor. Your local model diagnosed an image with: '{disease_prediction}' ({confidence:.1%} confidence). Present this result briefly. Then ask if the user wants treatment advice."
-        gemini_response = get_gemini_response(prompt)
+        gemini_response = get_gemini_response(prompt, priority=DIAGNOSIS_SUMMARY)
         
         # --- FALLBACK LOGIC ---
         if gemini_response is None:
@@ -130,13 +176,16 @@ def chat():
         treatment_keywords = ['treat', 'help', 'fix', 'cure', 'plan', 'advice']
 
         if context_disease and any(keyword in user_message.lower() for keyword in treatment_keywords):
+            priority = TREATMENT_FOLLOWUP
             prompt = f"{base_prompt} A user was diagnosed with '{context_disease}' and is asking for help: \"{user_message}\". Provide a brief, bullet-point summary of treatment options."
         elif context_disease:
+            priority = CASUAL_CHAT
             prompt = f"{base_prompt} You were discussing '{context_disease}'. The user now says: \"{user_message}\". Respond helpfully and concisely."
         else:
+            priority = CASUAL_CHAT
             prompt = f"{base_prompt} A user just said: '{user_message}'. Respond in a brief, conversational manner."
         
-        gemini_response = get_gemini_response(prompt)
+        gemini_response = get_gemini_response(prompt, priority=priority)
 
         # --- FALLBACK LOGIC ---
         if gemini_response is None:
@@ -146,6 +195,78 @@ def chat():
         
         return jsonify({'response': response_text, 'disease_name': context_disease})
 
+@app.route('/recommend_crop', methods=['POST'])
+def recommend_crop():
+    """Recommends crops for a district, a single point or a batch of points."""
+    if not crop_recommender:
+        return jsonify({'error': 'Crop recommender not loaded'}), 503
+    query = request.get_json(silent=True) or {}
+
+    try:
+        if 'points' in query:
+            points = pd.DataFrame(query['points'], columns=['latitude', 'longitude', 'elevation'])
+            latitudes = points['latitude'].to_numpy(dtype=float)
+            longitudes = points['longitude'].to_numpy(dtype=float)
+            elevations = points['elevation'].to_numpy(dtype=float)
+            # Missing elevations arrive as NaN and are interpolated; anything else must be finite.
+            if not (np.isfinite(latitudes).all() and np.isfinite(longitudes).all()) or np.isinf(elevations).any():
+                return jsonify({'error': 'Invalid location query: coordinates must be finite numbers.'}), 400
+
+            covered = crop_recommender.covers(latitudes, longitudes)
+            recommendations = [{'crop': None, 'score': None, 'error': 'Too far from any known district'}
+                               for _ in range(len(points))]
+            if covered.any():
+                crops, scores = crop_recommender.recommend_many(
+                    latitudes[covered], longitudes[covered], elevations[covered])
+                for i, crop, score in zip(np.flatnonzero(covered), crops, scores):
+                    recommendations[i] = {'crop': crop, 'score': round(float(score), 4)}
+            return jsonify({'recommendations': recommendations})
+
+        if 'district' in query:
+            location = crop_recommender.locate_district(str(query['district']))
+            if location is None:
+                return jsonify({'error': f"Unknown district '{query['district']}'. Send latitude and longitude instead."}), 404
+            latitude, longitude, elevation = location
+        else:
+            latitude = float(query['latitude'])
+            longitude = float(query['longitude'])
+            elevation = float(query['elevation']) if query.get('elevation') is not None else None
+            if not all(np.isfinite(value) for value in (latitude, longitude, elevation) if value is not None):
+                return jsonify({'error': 'Invalid location query: coordinates must be finite numbers.'}), 400
+            if not crop_recommender.covers(latitude, longitude)[0]:
+                return jsonify({'error': 'Location is too far from any known district.'}), 400
+
+        crop, score = crop_recommender.recommend(latitude, longitude, elevation)
+    except (KeyError, TypeError, ValueError, OverflowError) as e:
+        return jsonify({'error': f"Invalid location query: {e}"}), 400
+
+    return jsonify({'crop': crop, 'score': round(score, 4)})
+
+@app.route('/admin/profile', methods=['GET', 'POST', 'DELETE'])
+def admin_profile():
+    """Arms (POST), inspects (GET) or cancels (DELETE) request profiling."""
+    supplied_token = request.headers.get('X-Admin-Token', '')
+    if not PROFILER_ADMIN_TOKEN or not hmac.compare_digest(supplied_token.encode(), PROFILER_ADMIN_TOKEN.encode()):
+        return jsonify({'error': 'Not found'}), 404
+
+    if request.method == 'POST':
+        options = request.get_json(silent=True) or request.form
+        if not isinstance(options, dict):  # request.form is a dict subclass too
+            return jsonify({'error': 'Expected a JSON object or form fields.'}), 400
+        try:
+            requests_to_capture = options.get('requests')
+            seconds_to_capture = options.get('seconds')
+            profiler.arm(
+                requests=int(requests_to_capture) if requests_to_capture is not None else None,
+                seconds=float(seconds_to_capture) if seconds_to_capture is not None else None,
+            )
+        except (TypeError, ValueError, OverflowError) as e:
+            return jsonify({'error': str(e)}), 400
+    elif request.method == 'DELETE':
+        profiler.disarm()
+
+    return jsonify(profiler.status())
+
 if __name__ == '__main__':
     app.run(debug=True)
 
@@ -7,6 +7,15 @@ load_dotenv()
 # Gemini AI Configuration
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 GEMINI_MODEL = 'gemini-1.5-flash'  # Valid models: gemini-1.5-flash, gemini-1.5-pro
+GEMINI_API_BASE_URL = os.getenv('GEMINI_API_BASE_URL', 'https://generativelanguage.googleapis.com')  # Point at a local stub server for testing
+
+# Gemini Quota Budget (shared by all callers in a worker, see llm_scheduler.py)
+GEMINI_REQUESTS_PER_SECOND = float(os.getenv('GEMINI_REQUESTS_PER_SECOND', '0.25'))  # 15 requests per minute
+GEMINI_TOKENS_PER_MINUTE = int(os.getenv('GEMINI_TOKENS_PER_MINUTE', '1000000'))
+# Seconds each class of request may wait for quota before falling back to local text
+GEMINI_DIAGNOSIS_DEADLINE = float(os.getenv('GEMINI_DIAGNOSIS_DEADLINE', '20'))
+GEMINI_TREATMENT_DEADLINE = float(os.getenv('GEMINI_TREATMENT_DEADLINE', '12'))
+GEMINI_CASUAL_DEADLINE = float(os.getenv('GEMINI_CASUAL_DEADLINE', '6'))  # Keep above 1 / GEMINI_REQUESTS_PER_SECOND
 
 # Flask Configuration
 FLASK_SECRET_KEY = os.getenv('FLASK_SECRET_KEY', 'your-secret-key-here')
@@ -14,3 +23,12 @@ FLASK_DEBUG = os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
 
 # Model Configuration
 MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16 MB max upload size
+
+# Retraining Corpus Capture (see upload_capture.py)
+CAPTURE_UPLOADS = os.getenv('CAPTURE_UPLOADS', 'True').lower() == 'true'
+UPLOAD_CAPTURE_DIR = os.getenv('UPLOAD_CAPTURE_DIR', 'captured_uploads')  # Must stay outside static/, which Flask serves publicly
+UPLOAD_CAPTURE_QUEUE_SIZE = int(os.getenv('UPLOAD_CAPTURE_QUEUE_SIZE', '32'))  # Uploads beyond this are dropped, not waited on
+
+# Profiling Configuration
+PROFILER_ADMIN_TOKEN = os.getenv('PROFILER_ADMIN_TOKEN')  # Admin profiling endpoints are disabled when unset
+PROFILE_OUTPUT_DIR = os.getenv('PROFILE_OUTPUT_DIR', 'profiles')
@@ -0,0 +1,131 @@
+# crop_location.py
+# Location-aware crop recommendation. Districts from crop_recommendation_data.csv are
+# placed on the map using district_locations.csv and indexed in a KD-tree, so any
+# GPS point (with or without elevation) can be answered by blending the soil,
+# climate and precipitation profiles of the nearest known districts.
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KDTree
+from sklearn.tree import DecisionTreeClassifier
+
+PROFILE_COLUMNS = ['soil_type', 'climate', 'precipitation']
+
+KM_PER_DEGREE_LATITUDE = 110.57
+KM_PER_DEGREE_LONGITUDE = 111.32  # At the equator; scaled by cos(latitude)
+# Kilometres of horizontal distance that one kilometre of elevation counts as.
+# Climate changes far faster going up a hill than going across the plains.
+ELEVATION_WEIGHT = 100.0
+# Points farther than this from every known district are refused. Coverage grows
+# as districts are added to district_locations.csv.
+COVERAGE_RADIUS_KM = 100.0
+
+
+class LocationCropRecommender:
+    def __init__(self, n_neighbors=3, elevation_weight=ELEVATION_WEIGHT, coverage_radius_km=COVERAGE_RADIUS_KM):
+        """Initialize an untrained recommender that blends `n_neighbors` districts."""
+        self.n_neighbors = n_neighbors
+        self.elevation_weight = elevation_weight
+        self.coverage_radius_km = coverage_radius_km
+
+    def fit(self, data, locations):
+        """Builds the spatial index and profile model from the two district tables."""
+        merged = data.merge(locations, on='district', how='inner', validate='one_to_one')
+        unplaced = sorted(set(data['district']) - set(merged['district']))
+        if unplaced:
+            print(f"⚠️ No coordinates for districts: {', '.join(unplaced)}. They will be skipped.")
+
+        profiles = pd.get_dummies(merged[PROFILE_COLUMNS]).astype(float)
+        self.profile_columns = list(profiles.columns)
+        self.profiles = profiles.to_numpy()
+        self.crop_names, self.district_crops = np.unique(merged['recommended_crop'], return_inverse=True)
+        self.model = DecisionTreeClassifier(random_state=42)
+        self.model.fit(self.profiles, self.district_crops)
+
+        self.districts = merged['district'].to_numpy()
+        self._district_index = {name.lower(): i for i, name in enumerate(self.districts)}
+        self.latitudes = merged['latitude'].to_numpy(dtype=float)
+        self.longitudes = merged['longitude'].to_numpy(dtype=float)
+        self.elevations = merged['elevation_m'].to_numpy(dtype=float)
+        # Equirectangular projection around the centre of the districts; accurate
+        # to well under a kilometre at the scale of Nepal.
+        self._cos_reference = np.cos(np.radians(self.latitudes.mean()))
+        self._k = min(self.n_neighbors, len(self.districts))
+        self._plane_tree = KDTree(self._project(self.latitudes, self.longitudes))
+        self._terrain_tree = KDTree(self._project(self.latitudes, self.longitudes, self.elevations))
+        return self
+
+    def _project(self, latitudes, longitudes, elevations=None):
+        columns = [
+            latitudes * KM_PER_DEGREE_LATITUDE,
+            longitudes * KM_PER_DEGREE_LONGITUDE * self._cos_reference,
+        ]
+        if elevations is not None:
+            columns.append(elevations / 1000.0 * self.elevation_weight)
+        return np.column_stack(columns)
+
+    def covers(self, latitudes, longitudes):
+        """Returns a boolean mask of the points within coverage_radius_km of a known district."""
+        latitudes = np.atleast_1d(np.asarray(latitudes, dtype=float))
+        longitudes = np.atleast_1d(np.asarray(longitudes, dtype=float))
+        distances, _ = self._plane_tree.query(self._project(latitudes, longitudes), k=1)
+        return distances[:, 0] <= self.coverage_radius_km
+
+    @staticmethod
+    def _weights(distances):
+        """Normalised inverse-square-distance weights; an exact hit takes all the weight."""
+        weights = 1.0 / (distances + 1e-6) ** 2
+        return weights / weights.sum(axis=1, keepdims=True)
+
+    def recommend_many(self, latitudes, longitudes, elevations=None):
+        """
+        Recommends a crop for every point. Elevation may be omitted (or NaN per point),
+        in which case it is interpolated from the nearest districts. Points should be
+        checked with covers() first; answers far outside it are meaningless.
+        Returns arrays of crop names and scores between 0 and 1.
+        """
+        latitudes = np.atleast_1d(np.asarray(latitudes, dtype=float))
+        longitudes = np.atleast_1d(np.asarray(longitudes, dtype=float))
+        if elevations is None:
+            elevations = np.full(latitudes.shape, np.nan)
+        else:
+            elevations = np.atleast_1d(np.array(elevations, dtype=float))
+        if not (np.isfinite(latitudes).all() and np.isfinite(longitudes).all()):
+            raise ValueError("Latitude and longitude must be finite numbers.")
+        if np.isinf(elevations).any():
+            raise ValueError("Elevation must be a finite number.")
+
+        unknown_elevation = np.isnan(elevations)
+        if unknown_elevation.any():
+            distances, indices = self._plane_tree.query(
+                self._project(latitudes[unknown_elevation], longitudes[unknown_elevation]), k=self._k)
+            elevations[unknown_elevation] = (self._weights(distances) * self.elevations[indices]).sum(axis=1)
+
+        distances, indices = self._terrain_tree.query(
+            self._project(latitudes, longitudes, elevations), k=self._k)
+        weights = self._weights(distances)
+
+        # What the blended soil/climate/precipitation profile suits...
+        blended_profiles = np.einsum('nk,nkf->nf', weights, self.profiles[indices])
+        profile_scores = self.model.predict_proba(blended_profiles)
+        # ...and what the neighbouring districts actually grow, which separates
+        # crops whose districts share an identical profile.
+        neighbour_scores = np.zeros_like(profile_scores)
+        rows = np.arange(len(latitudes))
+        np.add.at(neighbour_scores, (rows[:, None], self.district_crops[indices]), weights)
+
+        scores = (profile_scores + neighbour_scores) / 2.0
+        best = scores.argmax(axis=1)
+        return self.crop_names[best], scores[rows, best]
+
+    def recommend(self, latitude, longitude, elevation=None):
+        """Recommends a crop for a single point. Returns (crop, score)."""
+        crops, scores = self.recommend_many([latitude], [longitude], None if elevation is None else [elevation])
+        return crops[0], float(scores[0])
+
+    def locate_district(self, district):
+        """Returns (latitude, longitude, elevation) for a known district, or None."""
+        i = self._district_index.get(district.strip().lower())
+        if i is None:
+            return None
+        return self.latitudes[i], self.longitudes[i], self.elevations[i]
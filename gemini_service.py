@@ -3,15 +3,20 @@ import requests
 import time
 from PIL import Image
 import io
-from config import GEMINI_API_KEY, GEMINI_MODEL
+from config import GEMINI_API_KEY, GEMINI_MODEL, GEMINI_API_BASE_URL
+from llm_scheduler import get_shared_scheduler, TREATMENT_FOLLOWUP, CASUAL_CHAT
+
+# Questions containing these words are treatment follow-ups rather than small talk.
+TREATMENT_KEYWORDS = ['treat', 'cure', 'fix', 'solution', 'medicine', 'help', 'save']
 
 class GeminiService:
-    def __init__(self):
+    def __init__(self, scheduler=None):
         """Initialize Gemini AI service."""
         self.api_key = GEMINI_API_KEY
         self.model = GEMINI_MODEL
-        self.api_url = f"https://generativelanguage.googleapis.com/v1beta/models/{self.model}:generateContent?key={self.api_key}"
+        self.api_url = f"{GEMINI_API_BASE_URL}/v1beta/models/{self.model}:generateContent?key={self.api_key}"
         self.api_available = bool(self.api_key)
+        self.scheduler = scheduler or get_shared_scheduler()
         
         if not self.api_available:
             print("⚠️  Running in test mode without Gemini API")
@@ -54,7 +59,7 @@ The user will ask you questions about their plant diagnosis. Provide helpful, co
 """
         return context
     
-    def _call_gemini_api(self, prompt):
+    def _call_gemini_api(self, prompt, priority=CASUAL_CHAT):
         """Make API call to Gemini."""
         if not self.api_available:
             return None
@@ -62,8 +67,12 @@ The user will ask you questions about their plant diagnosis. Provide helpful, co
         payload = {"contents": [{"parts": [{"text": prompt}]}]}
         max_retries = 3
         delay = 1
+        deadline = self.scheduler.deadline_for(priority)
         
         for attempt in range(max_retries):
+            if not self.scheduler.acquire(prompt, priority, deadline):
+                print("⏱️ Gemini quota busy, using fallback response.")
+                return None
             try:
                 response = requests.post(
                     self.api_url, 
@@ -77,13 +86,17 @@ The user will ask you questions about their plant diagnosis. Provide helpful, co
                 
             except requests.exceptions.RequestException as e:
                 print(f"API request failed (attempt {attempt + 1}): {e}")
-                if hasattr(e, 'response') and e.response and e.response.status_code == 403:
+                if hasattr(e, 'response') and e.response is not None and e.response.status_code == 403:
                     print("❌ Gemini API key is invalid or has insufficient permissions.")
                     return None
-                if hasattr(e, 'response') and e.response and e.response.status_code == 400:
+                if hasattr(e, 'response') and e.response is not None and e.response.status_code == 400:
                     print("❌ Invalid request format or model name.")
                     return None
-                time.sleep(delay)
+                if hasattr(e, 'response') and e.response is not None and e.response.status_code == 429:
+                    # Quota exhausted: hold back every caller rather than sleeping here.
+                    self.scheduler.pause(delay)
+                else:
+                    time.sleep(delay)
                 delay *= 2
                 
         print("❌ API connection failed after multiple retries.")
@@ -95,10 +108,12 @@ The user will ask you questions about their plant diagnosis. Provide helpful, co
             # Create context prompt
             context = self.create_context_prompt(analysis_data)
             full_prompt = f"{context}\n\nUser Question: {user_message}"
+            is_treatment_question = any(word in user_message.lower() for word in TREATMENT_KEYWORDS)
+            priority = TREATMENT_FOLLOWUP if is_treatment_question else CASUAL_CHAT
             
             # Try API call first
             if self.api_available:
-                api_response = self._call_gemini_api(full_prompt)
+                api_response = self._call_gemini_api(full_prompt, priority=priority)
                 if api_response:
                     return api_response
             
@@ -116,7 +131,7 @@ The user will ask you questions about their plant diagnosis. Provide helpful, co
             # Try API call first
             if self.api_available:
                 prompt = f"You are Agri-Sage AI, a friendly agricultural assistant for Nepal. User says: '{user_message}'. Respond helpfully and concisely."
-                api_response = self._call_gemini_api(prompt)
+                api_response = self._call_gemini_api(prompt, priority=CASUAL_CHAT)
                 if api_response:
                     return api_response
             
@@ -137,7 +152,7 @@ The user will ask you questions about their plant diagnosis. Provide helpful, co
         crop = analysis_data.get('crop_result', 'Unknown')
         
         # Natural response patterns based on user questions
-        if any(word in message_lower for word in ['treat', 'cure', 'fix', 'solution', 'medicine', 'help', 'save']):
+        if any(word in message_lower for word in TREATMENT_KEYWORDS):
             return f"""Looking at your plant with {disease}, I can help you with treatment options! 
 
 For treating {disease}, here are some effective approaches you can try:
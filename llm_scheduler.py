@@ -0,0 +1,161 @@
+# llm_scheduler.py
+# Shared admission control for upstream Gemini calls. Every caller asks the scheduler
+# for a slot before hitting the API; slots are handed out in priority order under a
+# requests/sec and tokens/min budget. A request that cannot be served before its
+# deadline is refused straight away so the caller can use its local fallback text.
+
+import heapq
+import itertools
+import math
+import threading
+import time
+
+# --- Priority Classes (lower value is served first) ---
+DIAGNOSIS_SUMMARY = 0
+TREATMENT_FOLLOWUP = 1
+CASUAL_CHAT = 2
+
+# Rough allowance for the response when budgeting tokens for a request.
+RESPONSE_TOKEN_ALLOWANCE = 512
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity, now):
+        """A bucket refilled at `rate` units per second up to `capacity` units."""
+        self.rate = rate
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = now
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def time_until(self, amount, now):
+        """Seconds until `amount` units are available."""
+        self._refill(now)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def consume(self, amount, now):
+        self._refill(now)
+        self.level -= amount
+
+    def drain(self, now):
+        self._refill(now)
+        self.level = min(self.level, 0.0)
+
+
+class _Ticket:
+    __slots__ = ('priority', 'sequence', 'tokens', 'deadline')
+
+    def __init__(self, priority, sequence, tokens, deadline):
+        self.priority = priority
+        self.sequence = sequence
+        self.tokens = tokens
+        self.deadline = deadline
+
+    def __lt__(self, other):
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+
+class LLMScheduler:
+    def __init__(self, requests_per_second, tokens_per_minute, deadlines, clock=time.monotonic):
+        """
+        Initialize the scheduler. `deadlines` maps each priority class to the seconds
+        a caller will wait for a slot. `clock` can be replaced by a fake clock in tests.
+        """
+        if not (math.isfinite(requests_per_second) and requests_per_second > 0):
+            raise ValueError(f"requests_per_second must be a positive number, got {requests_per_second}.")
+        if not (math.isfinite(tokens_per_minute) and tokens_per_minute > 0):
+            raise ValueError(f"tokens_per_minute must be a positive number, got {tokens_per_minute}.")
+        self.clock = clock
+        self.deadlines = dict(deadlines)
+        for priority in (DIAGNOSIS_SUMMARY, TREATMENT_FOLLOWUP, CASUAL_CHAT):
+            if priority not in self.deadlines:
+                raise ValueError(f"No deadline given for priority {priority}.")
+        for priority, seconds in self.deadlines.items():
+            if not (math.isfinite(seconds) and seconds > 0):
+                raise ValueError(f"Deadline for priority {priority} must be a positive number, got {seconds}.")
+        now = clock()
+        self._requests = TokenBucket(requests_per_second, max(1.0, requests_per_second), now)
+        self._tokens = TokenBucket(tokens_per_minute / 60.0, tokens_per_minute, now)
+        self._paused_until = now
+        self._queue = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    @staticmethod
+    def estimate_tokens(prompt):
+        """Approximates the token cost of a call (about four characters per token)."""
+        return max(1, len(prompt) // 4) + RESPONSE_TOKEN_ALLOWANCE
+
+    def deadline_for(self, priority):
+        """Absolute deadline for a request of `priority` submitted now."""
+        return self.clock() + self.deadlines[priority]
+
+    def _projected_wait(self, ticket, now):
+        """Seconds until `ticket` and every ticket queued ahead of it fit in the budget."""
+        ahead = [t for t in self._queue if t < ticket]
+        requests_needed = len(ahead) + 1
+        tokens_needed = sum(t.tokens for t in ahead) + ticket.tokens
+        return max(
+            self._paused_until - now,
+            self._requests.time_until(requests_needed, now),
+            self._tokens.time_until(tokens_needed, now),
+        )
+
+    def acquire(self, prompt, priority=CASUAL_CHAT, deadline=None):
+        """
+        Blocks until the call may go upstream and returns True, or returns False as
+        soon as it is clear the call cannot start before `deadline` (a clock value).
+        """
+        if deadline is None:
+            deadline = self.deadline_for(priority)
+        with self._condition:
+            ticket = _Ticket(priority, next(self._sequence), self.estimate_tokens(prompt), deadline)
+            heapq.heappush(self._queue, ticket)
+            try:
+                while True:
+                    now = self.clock()
+                    wait = self._projected_wait(ticket, now)
+                    if now + wait > ticket.deadline:
+                        return False
+                    if wait <= 0 and self._queue[0] is ticket:
+                        self._requests.consume(1, now)
+                        self._tokens.consume(ticket.tokens, now)
+                        return True
+                    # Tickets ahead of us are being admitted; re-check once they are.
+                    self._condition.wait(max(wait, 0.01))
+            finally:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._condition.notify_all()
+
+    def pause(self, seconds):
+        """Stops admitting requests for `seconds`, e.g. after the API answers 429."""
+        with self._condition:
+            now = self.clock()
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._requests.drain(now)
+            self._condition.notify_all()
+
+
+_shared_scheduler = None
+_shared_lock = threading.Lock()
+
+def get_shared_scheduler():
+    """Returns the process-wide scheduler configured from config.py."""
+    global _shared_scheduler
+    with _shared_lock:
+        if _shared_scheduler is None:
+            from config import (GEMINI_REQUESTS_PER_SECOND, GEMINI_TOKENS_PER_MINUTE,
+                                GEMINI_DIAGNOSIS_DEADLINE, GEMINI_TREATMENT_DEADLINE, GEMINI_CASUAL_DEADLINE)
+            _shared_scheduler = LLMScheduler(GEMINI_REQUESTS_PER_SECOND, GEMINI_TOKENS_PER_MINUTE, deadlines={
+                DIAGNOSIS_SUMMARY: GEMINI_DIAGNOSIS_DEADLINE,
+                TREATMENT_FOLLOWUP: GEMINI_TREATMENT_DEADLINE,
+                CASUAL_CHAT: GEMINI_CASUAL_DEADLINE,
+            })
+        return _shared_scheduler
@@ -0,0 +1,179 @@
+# profiler.py
+# On-demand profiling for live workers. An admin arms the profiler for the next N
+# requests or the next T seconds; each profiled request then writes a cProfile
+# pstats dump, a flamegraph-compatible folded stack file and a TensorFlow trace.
+# When nothing is armed the wrapped handlers run untouched.
+
+import cProfile
+import functools
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+# Upper limits on how long a single arm() can keep profiling switched on.
+MAX_ARM_REQUESTS = 1000
+MAX_ARM_SECONDS = 3600
+
+
+class _StackSampler(threading.Thread):
+    """Samples the call stack of one thread at a fixed interval."""
+
+    def __init__(self, thread_id, interval=0.005):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.counts[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def write_folded(self, path):
+        """Writes stacks in the folded format read by flamegraph.pl and speedscope."""
+        with open(path, 'w') as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class RequestProfiler:
+    def __init__(self, output_dir='profiles', sample_interval=0.005):
+        """Initialize a disarmed profiler that writes captures under output_dir."""
+        self.output_dir = output_dir
+        self.sample_interval = sample_interval
+        self.armed = False
+        self._remaining_requests = None
+        self._deadline = None
+        self._sequence = 0
+        self._lock = threading.Lock()
+        # The TensorFlow profiler is process-wide, so only one request can own it.
+        self._tf_lock = threading.Lock()
+
+    def arm(self, requests=None, seconds=None):
+        """Arms the profiler for the next `requests` requests and/or `seconds` seconds."""
+        if requests is None and seconds is None:
+            raise ValueError("Specify 'requests', 'seconds' or both.")
+        if requests is not None and not 0 < requests <= MAX_ARM_REQUESTS:
+            raise ValueError(f"'requests' must be between 1 and {MAX_ARM_REQUESTS}.")
+        if seconds is not None and not (math.isfinite(seconds) and 0 < seconds <= MAX_ARM_SECONDS):
+            raise ValueError(f"'seconds' must be a number above 0 and at most {MAX_ARM_SECONDS}.")
+        with self._lock:
+            self._remaining_requests = requests
+            self._deadline = time.monotonic() + seconds if seconds is not None else None
+            self.armed = True
+        print(f"🔬 Profiler armed (requests={requests}, seconds={seconds}).")
+
+    def disarm(self):
+        with self._lock:
+            self._disarm_locked()
+
+    def _disarm_locked(self):
+        self.armed = False
+        self._remaining_requests = None
+        self._deadline = None
+
+    def status(self):
+        with self._lock:
+            remaining_seconds = None
+            if self._deadline is not None:
+                remaining_seconds = max(0.0, round(self._deadline - time.monotonic(), 3))
+            return {
+                'armed': self.armed,
+                'remaining_requests': self._remaining_requests,
+                'remaining_seconds': remaining_seconds,
+                'captures': self._sequence,
+                'output_dir': os.path.abspath(self.output_dir),
+            }
+
+    def _claim(self, label):
+        """Reserves a capture slot and returns its output directory, or None if disarmed."""
+        with self._lock:
+            if not self.armed:
+                return None
+            if self._deadline is not None and time.monotonic() >= self._deadline:
+                self._disarm_locked()
+                return None
+            if self._remaining_requests is not None:
+                self._remaining_requests -= 1
+                if self._remaining_requests <= 0:
+                    self._disarm_locked()
+            self._sequence += 1
+            sequence = self._sequence
+        timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        return os.path.join(self.output_dir, f"{timestamp}-{label}-{sequence:04d}")
+
+    def _start_tf_trace(self, logdir):
+        if not self._tf_lock.acquire(blocking=False):
+            return False
+        try:
+            import tensorflow as tf
+            tf.profiler.experimental.start(logdir)
+            return True
+        except Exception as e:
+            print(f"⚠️ TensorFlow profiler could not start: {e}")
+            self._tf_lock.release()
+            return False
+
+    def _stop_tf_trace(self):
+        try:
+            import tensorflow as tf
+            tf.profiler.experimental.stop()
+        except Exception as e:
+            print(f"⚠️ TensorFlow profiler could not stop: {e}")
+        finally:
+            self._tf_lock.release()
+
+    def profiled(self, label):
+        """Decorator that profiles the wrapped function while the profiler is armed."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.armed:
+                    return func(*args, **kwargs)
+                capture_dir = self._claim(label)
+                if capture_dir is None:
+                    return func(*args, **kwargs)
+                return self._run_captured(capture_dir, func, args, kwargs)
+            return wrapper
+        return decorator
+
+    def _run_captured(self, capture_dir, func, args, kwargs):
+        try:
+            os.makedirs(capture_dir, exist_ok=True)
+        except OSError as e:
+            print(f"⚠️ Could not create profile directory {capture_dir}: {e}")
+            return func(*args, **kwargs)
+        tf_traced = self._start_tf_trace(os.path.join(capture_dir, 'tf'))
+        sampler = _StackSampler(threading.get_ident(), self.sample_interval)
+        sampler.start()
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            return profile.runcall(func, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            sampler.stop()
+            if tf_traced:
+                self._stop_tf_trace()
+            # A failed capture must never change the response of the profiled request.
+            try:
+                profile.dump_stats(os.path.join(capture_dir, 'profile.pstats'))
+                sampler.write_folded(os.path.join(capture_dir, 'stacks.folded'))
+                print(f"🔬 Captured profile in {capture_dir} ({elapsed * 1000:.1f} ms).")
+            except Exception as e:
+                print(f"⚠️ Could not write profile to {capture_dir}: {e}")
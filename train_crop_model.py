@@ -6,6 +6,7 @@ import pandas as pd
 from sklearn.tree import DecisionTreeClassifier
 from sklearn.preprocessing import LabelEncoder
 import joblib
+from crop_location import LocationCropRecommender
 
 def train_crop_recommender():
     """Trains and saves the crop recommendation model on the entire dataset."""
@@ -50,5 +51,23 @@ def train_crop_recommender():
     print("Associated files 'crop_model_columns.joblib' and 'crop_label_encoder.joblib' also saved.")
 
 
+def train_location_recommender():
+    """Builds and saves the location-aware recommender with its spatial index."""
+    try:
+        data = pd.read_csv('crop_recommendation_data.csv')
+        locations = pd.read_csv('district_locations.csv')
+    except FileNotFoundError as e:
+        print(f"Error: {e.filename!r} not found.")
+        return
+
+    print("Building the location-aware crop recommender...")
+    recommender = LocationCropRecommender().fit(data, locations)
+    print(f"Indexed {len(recommender.districts)} districts.")
+
+    joblib.dump(recommender, 'crop_location_recommender.joblib')
+    print("Recommender saved as 'crop_location_recommender.joblib'")
+
+
 if __name__ == '__main__':
-    train_crop_recommender()
\ No newline at end of file
+    train_crop_recommender()
+    train_location_recommender()
\ No newline at end of file
@@ -7,9 +7,11 @@ from tensorflow.keras.applications import MobileNetV2
 from tensorflow.keras.layers import Dense, GlobalAveragePooling2D
 from tensorflow.keras.models import Model
 import os
+import shutil
 import requests
 import zipfile
 import matplotlib.pyplot as plt
+from config import UPLOAD_CAPTURE_DIR
 
 def find_image_directory(root_path):
     """
@@ -70,6 +72,35 @@ def download_and_extract_dataset():
     return image_dir
 
 
+def merge_captured_uploads(image_dir, capture_dir):
+    """
+    Copies leaf photos captured from /chat (see upload_capture.py) into the matching
+    class folders of the training set. Captures are named by their hash, so they never
+    overwrite dataset images and are only copied once across runs.
+    """
+    if not os.path.isdir(capture_dir):
+        return
+
+    copied = 0
+    for class_name in sorted(os.listdir(capture_dir)):
+        source_dir = os.path.join(capture_dir, class_name)
+        target_dir = os.path.join(image_dir, class_name)
+        if not os.path.isdir(source_dir):
+            continue  # e.g. manifest.csv
+        if not os.path.isdir(target_dir):
+            print(f"Skipping captured class '{class_name}': not a class in the training set.")
+            continue
+        for file_name in os.listdir(source_dir):
+            if not file_name.endswith(('.jpg', '.png')):
+                continue
+            target_path = os.path.join(target_dir, file_name)
+            if not os.path.exists(target_path):
+                shutil.copy2(os.path.join(source_dir, file_name), target_path)
+                copied += 1
+
+    print(f"Merged {copied} new captured uploads from '{capture_dir}' into the training set.")
+
+
 def create_model(num_classes):
     """Creates a CNN model using transfer learning with MobileNetV2."""
     base_model = MobileNetV2(weights='imagenet', include_top=False, input_shape=(224, 224, 3))
@@ -92,6 +123,9 @@ def train_model():
     if image_dir is None:
         return
 
+    # Add user uploads captured by the app, labelled with the model's own predictions.
+    merge_captured_uploads(image_dir, UPLOAD_CAPTURE_DIR)
+
     # Image dimensions
     img_width, img_height = 224, 224
     batch_size = 32
@@ -0,0 +1,154 @@
+# upload_capture.py
+# Background capture of uploaded leaf photos for the next train_disease_model.py run.
+# Requests hand the raw bytes to a bounded queue and return immediately; a worker
+# thread stores each image once under its SHA-256 hash in a directory named after
+# the predicted class, i.e. the layout flow_from_directory() expects:
+#
+#   captured_uploads/<class name>/<sha256>.<ext>
+#   captured_uploads/manifest.csv   (sha256, label, confidence, captured_at)
+#
+# Images are re-encoded before they are written so EXIF data (including GPS
+# positions) never reaches the corpus. The root must not be served publicly.
+# When the queue or its byte budget is full, captures are dropped instead of
+# making the request wait.
+
+import csv
+import hashlib
+import os
+import queue
+import tempfile
+import threading
+from datetime import datetime, timezone
+from io import BytesIO
+from PIL import Image, ImageOps
+
+# JPEG uploads (MPO is how Pillow reports many phone JPEGs) are stored as JPEG;
+# everything else is stored as PNG. Both are formats flow_from_directory() reads.
+JPEG_FORMATS = {'JPEG', 'MPO'}
+JPEG_QUALITY = 95
+MANIFEST_FIELDS = ['sha256', 'label', 'confidence', 'captured_at']
+
+
+class UploadCapture:
+    def __init__(self, root='captured_uploads', max_queue=32, max_pending_bytes=64 * 1024 * 1024):
+        """Initialize the capture store. Call start() to launch the writer thread."""
+        self.root = root
+        self.manifest_path = os.path.join(root, 'manifest.csv')
+        self.max_pending_bytes = max_pending_bytes
+        self.captured = 0
+        self.duplicates = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pending_bytes = 0
+        self._lock = threading.Lock()
+        self._known_hashes = set()
+        self._worker = None
+
+    def start(self):
+        os.makedirs(self.root, exist_ok=True)
+        self._load_manifest()
+        self._worker = threading.Thread(target=self._run, name='upload-capture', daemon=True)
+        self._worker.start()
+        print(f"✅ Upload capture writing to '{self.root}' ({len(self._known_hashes)} images already stored).")
+
+    def stop(self, timeout=5.0):
+        """Writes out what is queued, then stops the writer thread."""
+        if self._worker is None:
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._worker.join(timeout)
+        self._worker = None
+
+    def submit(self, image_bytes, label, confidence):
+        """Queues an upload for capture. Never blocks; returns False if it was dropped."""
+        size = len(image_bytes)
+        with self._lock:
+            if self._worker is None or self._pending_bytes + size > self.max_pending_bytes:
+                self.dropped += 1
+                return False
+            self._pending_bytes += size
+        try:
+            self._queue.put_nowait((image_bytes, label, confidence))
+        except queue.Full:
+            with self._lock:
+                self._pending_bytes -= size
+                self.dropped += 1
+            return False
+        return True
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return
+        with open(self.manifest_path, newline='') as f:
+            self._known_hashes.update(row['sha256'] for row in csv.DictReader(f))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            image_bytes, label, confidence = item
+            try:
+                self._store(image_bytes, label, confidence)
+            except Exception as e:
+                print(f"⚠️ Could not capture upload: {e}")
+            finally:
+                with self._lock:
+                    self._pending_bytes -= len(image_bytes)
+
+    def _store(self, image_bytes, label, confidence):
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        if digest in self._known_hashes:
+            self.duplicates += 1
+            return
+
+        image = Image.open(BytesIO(image_bytes))
+        is_jpeg = image.format in JPEG_FORMATS
+        # Re-encoding drops EXIF and other metadata; apply the EXIF rotation first
+        # so the stored pixels still face the right way.
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        buffered = BytesIO()
+        if is_jpeg:
+            image.save(buffered, format='JPEG', quality=JPEG_QUALITY)
+            extension = '.jpg'
+        else:
+            image.save(buffered, format='PNG')
+            extension = '.png'
+
+        class_dir = os.path.join(self.root, label)
+        path = os.path.join(class_dir, digest + extension)
+        os.makedirs(class_dir, exist_ok=True)
+        # Write to a temporary file, then claim the final name with a hard link,
+        # which fails if any process got there first. A half-written image never
+        # lands in the training tree and only the winner adds a manifest row.
+        fd, tmp_path = tempfile.mkstemp(dir=class_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(buffered.getvalue())
+            os.link(tmp_path, path)
+        except FileExistsError:
+            self._known_hashes.add(digest)
+            self.duplicates += 1
+            return
+        finally:
+            os.unlink(tmp_path)
+
+        self._append_manifest(digest, label, confidence)
+        self._known_hashes.add(digest)
+        self.captured += 1
+
+    def _append_manifest(self, digest, label, confidence):
+        is_new = not os.path.exists(self.manifest_path)
+        with open(self.manifest_path, 'a', newline='') as f:
+            writer = csv.writer(f)
+            if is_new:
+                writer.writerow(MANIFEST_FIELDS)
+            writer.writerow([
+                digest,
+                label,
+                f"{confidence:.4f}",
+                datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            ])